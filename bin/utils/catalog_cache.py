@@ -0,0 +1,87 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+
+# sqlite allows at most 999 bound parameters per statement
+MAX_KEYS_PER_QUERY = 500
+
+class CatalogCache():
+    """
+    Local on-disk cache of catalog documents, keyed by (collection, key)
+    and tagged with a vault so writes can invalidate a whole vault at once.
+    Entries older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.cnx = None
+        self.cnx_pid = None
+
+    def get_many(self, collection, keys):
+        docs = {}
+        oldest = time.time() - self.ttl
+        for chunk in self._chunks(keys):
+            rows = self._execute("SELECT key, doc FROM entries WHERE collection = ? AND cachedOn >= ? "
+                                 "AND key IN (%s)" % ",".join("?" * len(chunk)),
+                                 [collection, oldest] + chunk)
+            for key, doc in rows:
+                docs[key] = pickle.loads(str(doc))
+        return docs
+
+    def get(self, collection, key):
+        return self.get_many(collection, [key]).get(key)
+
+    def put_many(self, collection, entries):
+        # entries are (key, vault, doc) tuples
+        now = time.time()
+        self._execute_many("INSERT OR REPLACE INTO entries (collection, key, vault, doc, cachedOn) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           [ (collection, key, vault, sqlite3.Binary(pickle.dumps(doc, 2)), now)
+                             for key, vault, doc in entries ])
+
+    def put(self, collection, key, vault, doc):
+        self.put_many(collection, [(key, vault, doc)])
+
+    def invalidate(self, collection, keys):
+        for chunk in self._chunks(keys):
+            self._execute("DELETE FROM entries WHERE collection = ? AND key IN (%s)" % ",".join("?" * len(chunk)),
+                          [collection] + chunk)
+
+    def invalidate_vaults(self, collection, vaults):
+        for chunk in self._chunks(vaults):
+            self._execute("DELETE FROM entries WHERE collection = ? AND vault IN (%s)" % ",".join("?" * len(chunk)),
+                          [collection] + chunk)
+
+    def _chunks(self, keys):
+        keys = list(keys)
+        return [ keys[x:x + MAX_KEYS_PER_QUERY] for x in xrange(0, len(keys), MAX_KEYS_PER_QUERY) ]
+
+    def _connection(self):
+        # sqlite connections must not cross a fork, so each process opens its own
+        if self.cnx_pid != os.getpid():
+            self.cnx = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.cnx.execute("CREATE TABLE IF NOT EXISTS entries (collection TEXT, key TEXT, vault TEXT, "
+                             "doc BLOB, cachedOn REAL, PRIMARY KEY (collection, key))")
+            self.cnx.execute("CREATE INDEX IF NOT EXISTS entries_by_vault ON entries (collection, vault)")
+            # expired entries are never served, drop them so the file stays small
+            self.cnx.execute("DELETE FROM entries WHERE cachedOn < ?", [time.time() - self.ttl])
+            self.cnx.commit()
+            self.cnx_pid = os.getpid()
+        return self.cnx
+
+    def _execute(self, statement, parameters):
+        with self.lock:
+            cnx = self._connection()
+            rows = cnx.execute(statement, parameters).fetchall()
+            cnx.commit()
+            return rows
+
+    def _execute_many(self, statement, parameters):
+        with self.lock:
+            cnx = self._connection()
+            cnx.executemany(statement, parameters)
+            cnx.commit()
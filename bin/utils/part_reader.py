@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import threading
+
+from Queue import Queue
+from multiprocessing import Array, Condition, Value
+
+# how often waiters re-check that the processes they wait on are alive
+LIVENESS_POLL_SECONDS = 0.5
+
+# how often a reader that holds a part re-checks for a read-ahead slot
+SLOT_POLL_SECONDS = 0.05
+
+# linux values, python 2 has no os.POSIX_FADV_* to read them from
+POSIX_FADV_SEQUENTIAL = 2
+POSIX_FADV_WILLNEED = 3
+
+def _load_posix_fadvise():
+    if hasattr(os, 'posix_fadvise'):
+        return os.posix_fadvise
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        # the 64-bit variant takes 64-bit offsets on 32-bit systems as well
+        fadvise = getattr(libc, 'posix_fadvise64', None) or libc.posix_fadvise
+    except (OSError, AttributeError):
+        return None
+    fadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+    fadvise.restype = ctypes.c_int
+    return fadvise
+
+POSIX_FADVISE = _load_posix_fadvise()
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno != errno.ESRCH
+    # a killed worker stays a zombie until the parent joins it
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return True
+
+class DiskReadScheduler():
+    """
+    Lets one reader at a time on the disk, shared by the upload workers.
+    When several readers are waiting the lowest file offset goes first, so
+    a spinning disk sees forward reads instead of seeks between workers.
+    Readers that are not waiting on the disk are never held back.
+    """
+
+    def __init__(self, number_of_readers):
+        self.condition = Condition()
+        # pid of the process reading from the disk, 0 when free
+        self.holder = Value('i', 0, lock=False)
+        # offset each reader is waiting to read at, -1 when not waiting
+        # (doubles hold byte offsets exactly up to 2 ** 53)
+        self.waiting = Array('d', [-1] * number_of_readers, lock=False)
+        self.waiting_pids = Array('i', [0] * number_of_readers, lock=False)
+
+    def acquire(self, reader, offset):
+        self.condition.acquire()
+        try:
+            self.waiting[reader] = offset
+            self.waiting_pids[reader] = os.getpid()
+            # no timeout, a slow read keeps the disk for as long as it takes;
+            # only a holder or waiter that died is skipped
+            while self._held_by_other() or self._lower_offset_waiting(reader, offset):
+                self.condition.wait(LIVENESS_POLL_SECONDS)
+            self.waiting[reader] = -1
+            self.holder.value = os.getpid()
+        finally:
+            self.condition.release()
+
+    def release(self):
+        self.condition.acquire()
+        try:
+            if self.holder.value == os.getpid():
+                self.holder.value = 0
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+    def _held_by_other(self):
+        holder = self.holder.value
+        return holder and holder != os.getpid() and _is_alive(holder)
+
+    def _lower_offset_waiting(self, reader, offset):
+        for other, other_offset in enumerate(self.waiting):
+            if (other != reader and 0 <= other_offset < offset
+                    and _is_alive(self.waiting_pids[other])):
+                return True
+        return False
+
+class PrefetchingPartReader():
+    """
+    Yields (byte_range, data) for byte_ranges, reading ahead on a background
+    thread while the caller sends the current part.
+
+    Each worker always has room for one part, like a plain read-then-send
+    loop. Every part read beyond that takes one of read_ahead_slots, a
+    semaphore shared by all workers of an upload, so the upload holds at
+    most workers + read-ahead slots parts in memory. Without slots parts
+    are read synchronously.
+
+    scheduler is an optional DiskReadScheduler shared by the workers,
+    reader being this worker's slot in it.
+    """
+
+    def __init__(self, filename, byte_ranges, read_ahead_slots=None, scheduler=None, reader=0):
+        self.filename = filename
+        self.byte_ranges = byte_ranges
+        self.read_ahead_slots = read_ahead_slots
+        self.scheduler = scheduler
+        self.reader = reader
+        # parts read or being read and not yet sent
+        self.held = 0
+        self.held_lock = threading.Lock()
+
+    def __iter__(self):
+        if not self.read_ahead_slots:
+            with open(self.filename, 'rb') as f:
+                for index in xrange(len(self.byte_ranges)):
+                    yield self.byte_ranges[index], self._read_part(f, index)
+            return
+
+        buffers = Queue()
+        reader = threading.Thread(target=self._read_parts, args=(buffers,))
+        reader.daemon = True
+        reader.start()
+
+        for byte_range in self.byte_ranges:
+            data, used_slot, exc_info = buffers.get()
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield byte_range, data
+            # the caller asks for the next part once this one is sent
+            self._release(used_slot)
+
+    def _read_parts(self, buffers):
+        try:
+            with open(self.filename, 'rb') as f:
+                self._advise(f.fileno(), 0, 0, POSIX_FADV_SEQUENTIAL)
+                for index in xrange(len(self.byte_ranges)):
+                    used_slot = self._reserve()
+                    buffers.put((self._read_part(f, index), used_slot, None))
+        except Exception:
+            buffers.put((None, False, sys.exc_info()))
+
+    def _reserve(self):
+        # returns whether a shared read-ahead slot was taken
+        while True:
+            with self.held_lock:
+                if self.held == 0:
+                    self.held = 1
+                    return False
+            if self.read_ahead_slots.acquire(True, SLOT_POLL_SECONDS):
+                with self.held_lock:
+                    self.held += 1
+                return True
+
+    def _release(self, used_slot):
+        with self.held_lock:
+            self.held -= 1
+        if used_slot:
+            self.read_ahead_slots.release()
+
+    def _read_part(self, f, index):
+        byte_range = self.byte_ranges[index]
+
+        if self.scheduler:
+            self.scheduler.acquire(self.reader, byte_range.get_starting_byte())
+        try:
+            f.seek(byte_range.get_starting_byte())
+            data = f.read(byte_range.get_chunk_size())
+        finally:
+            if self.scheduler:
+                self.scheduler.release()
+
+        # let the kernel start pulling in our next part while this one is sent
+        if index + 1 < len(self.byte_ranges):
+            next_range = self.byte_ranges[index + 1]
+            self._advise(f.fileno(), next_range.get_starting_byte(),
+                         next_range.get_chunk_size(), POSIX_FADV_WILLNEED)
+        return data
+
+    def _advise(self, fd, offset, length, advice):
+        # only a hint, skipped where posix_fadvise is not available
+        if POSIX_FADVISE:
+            try:
+                POSIX_FADVISE(fd, offset, length, advice)
+            except OSError:
+                pass
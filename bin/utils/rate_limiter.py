@@ -0,0 +1,33 @@
+import time
+
+from multiprocessing import Lock, Value
+
+class RateLimiter():
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else self.rate
+        # shared through fork so every worker process draws from one bucket
+        self.lock = Lock()
+        self.tokens = Value('d', self.burst, lock=False)
+        self.last_refill = Value('d', time.time(), lock=False)
+
+    def get_rate(self):
+        return self.rate
+
+    def acquire(self, amount=1):
+        self.lock.acquire()
+        try:
+            now = time.time()
+            refill = (now - self.last_refill.value) * self.rate
+            self.tokens.value = min(self.burst, self.tokens.value + refill)
+            self.last_refill.value = now
+            # reserve up front and go into debt, so amounts larger than the
+            # burst size (e.g. whole parts in bytes) still get through
+            self.tokens.value -= amount
+            deficit = -self.tokens.value
+        finally:
+            self.lock.release()
+
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
@@ -0,0 +1,236 @@
+import os
+import time
+import heapq
+import hashlib
+
+MiB = 1024 ** 2
+GiB = MiB * 1024
+
+# us-east-1 list prices, only used for estimates
+UPLOAD_REQUEST_PRICE = 0.05 / 1000
+STORAGE_PRICE_PER_GB_MONTH = 0.004
+
+# rough resident size of one python process with boto3 and pymongo loaded
+PROCESS_OVERHEAD_BYTES = 40 * MiB
+
+# botocore computes both a tree hash and a linear SHA-256 of every part body
+HASH_PASSES_PER_PART = 2
+
+def measure_read_speed(filename, sample_size=64 * MiB):
+    # note: a file that is already in the page cache will look very fast
+    read = 0
+    start = time.time()
+    with open(filename, 'rb') as f:
+        while read < sample_size:
+            data = f.read(MiB)
+            if not data:
+                break
+            read += len(data)
+    elapsed = time.time() - start
+    return read / max(elapsed, 1e-6)
+
+def measure_hash_rate(sample_size=64 * MiB):
+    data = os.urandom(MiB)
+    sha256 = hashlib.sha256()
+    start = time.time()
+    for _ in xrange(sample_size / MiB):
+        sha256.update(data)
+    elapsed = time.time() - start
+    return sample_size / max(elapsed, 1e-6)
+
+class _Flow():
+
+    def __init__(self, resource, size, cap, on_done):
+        self.resource = resource
+        self.remaining = float(size)
+        self.cap = cap
+        self.on_done = on_done
+        self.rate = 0.0
+
+class _Worker():
+
+    def __init__(self, part_sizes):
+        self.part_sizes = part_sizes
+        self.ready = []
+        self.reading = False
+        self.sending = False
+        self.next_to_read = 0
+        self.taken = 0
+        self.sent = 0
+        # parts read or being read and not yet sent
+        self.held = 0
+
+class UploadSimulator():
+    """
+    Fluid model of an upload: disk, cpu and network are shared equally
+    between the flows using them, workers read (with read-ahead), hash and
+    send their parts, and the treehash process reads the whole file.
+    """
+
+    def __init__(self, partitioned_part_sizes, prefetch_depth, read_speed, 
+                 hash_rate, bandwidth, rtt, cpu_count):
+        self.workers = [ _Worker(sizes) for sizes in partitioned_part_sizes if sizes ]
+        self.prefetch_depth = prefetch_depth
+        self.free_read_ahead_slots = prefetch_depth
+        self.rtt = rtt
+        self.hash_rate = hash_rate
+        self.capacity = {
+            "disk": float(read_speed),
+            "cpu": float(hash_rate) * cpu_count,
+            "network": float(bandwidth)
+        }
+
+        self.now = 0.0
+        self.flows = []
+        self.timers = []
+        self.busy = dict((resource, 0.0) for resource in self.capacity)
+        self.buffers_in_use = 0
+        self.buffer_bytes = 0
+        self.peak_buffer_bytes = 0
+        self.uploads_done_at = 0.0
+        self.treehash_done_at = 0.0
+
+    def run(self):
+        total_size = sum([ sum(worker.part_sizes) for worker in self.workers ])
+        number_of_parts = sum([ len(worker.part_sizes) for worker in self.workers ])
+
+        # initiate_multipart_upload
+        self.now = self.rtt
+
+        self._start_flow("disk", total_size, self.hash_rate, self._treehash_done)
+        for worker in self.workers:
+            self._try_read(worker)
+
+        while self.flows or self.timers:
+            self._step()
+
+        # complete_multipart_upload
+        wall_clock = max(self.uploads_done_at, self.treehash_done_at) + self.rtt
+        number_of_requests = number_of_parts + 2
+
+        return {
+            "wallClockSeconds": wall_clock,
+            "uploadsDoneSeconds": self.uploads_done_at,
+            "treehashDoneSeconds": self.treehash_done_at,
+            "peakMemoryBytes": self.peak_buffer_bytes + PROCESS_OVERHEAD_BYTES * (len(self.workers) + 2),
+            "peakBufferBytes": self.peak_buffer_bytes,
+            "requests": number_of_requests,
+            "requestCost": number_of_requests * UPLOAD_REQUEST_PRICE,
+            "storageCostPerMonth": total_size / float(GiB) * STORAGE_PRICE_PER_GB_MONTH,
+            "utilization": dict((resource, self.busy[resource] / (self.capacity[resource] * wall_clock))
+                                for resource in self.capacity if wall_clock)
+        }
+
+    def _start_flow(self, resource, size, cap, on_done):
+        self.flows.append(_Flow(resource, size, cap, on_done))
+
+    def _allocate_rates(self):
+        for resource, capacity in self.capacity.items():
+            flows = sorted([ flow for flow in self.flows if flow.resource == resource ],
+                           key=lambda flow: flow.cap or capacity)
+            # water-filling: capped flows take what they can use, the rest
+            # split what is left
+            left = capacity
+            for index, flow in enumerate(flows):
+                share = left / (len(flows) - index)
+                flow.rate = min(flow.cap, share) if flow.cap else share
+                left -= flow.rate
+
+    def _step(self):
+        self._allocate_rates()
+
+        step = None
+        for flow in self.flows:
+            finish = flow.remaining / flow.rate
+            if step is None or finish < step:
+                step = finish
+        if self.timers and (step is None or self.timers[0][0] - self.now < step):
+            step = max(self.timers[0][0] - self.now, 0.0)
+
+        self.now += step
+        finished = []
+        for flow in self.flows:
+            flow.remaining -= flow.rate * step
+            self.busy[flow.resource] += flow.rate * step
+            if flow.remaining <= 1e-6:
+                finished.append(flow)
+        for flow in finished:
+            self.flows.remove(flow)
+            flow.on_done()
+
+        while self.timers and self.timers[0][0] <= self.now:
+            _, _, callback = heapq.heappop(self.timers)
+            callback()
+
+    def _treehash_done(self):
+        self.treehash_done_at = self.now
+
+    def _try_read(self, worker):
+        if worker.reading or worker.next_to_read >= len(worker.part_sizes):
+            return
+        # mirrors PrefetchingPartReader: without read-ahead a part is only
+        # read once the previous one was sent, otherwise each worker has room
+        # for one part and every part beyond that takes a shared slot
+        used_slot = False
+        if self.prefetch_depth < 1:
+            if worker.sent < worker.next_to_read:
+                return
+        elif worker.held:
+            if not self.free_read_ahead_slots:
+                return
+            self.free_read_ahead_slots -= 1
+            used_slot = True
+
+        size = worker.part_sizes[worker.next_to_read]
+        worker.reading = True
+        worker.held += 1
+        self._allocate_buffer(size)
+
+        def read_done():
+            worker.reading = False
+            worker.ready.append((size, used_slot))
+            worker.next_to_read += 1
+            self._try_send(worker)
+            self._try_read(worker)
+
+        self._start_flow("disk", size, None, read_done)
+
+    def _try_send(self, worker):
+        if worker.sending or not worker.ready:
+            return
+        size, used_slot = worker.ready.pop(0)
+        worker.sending = True
+        worker.taken += 1
+
+        def response_received():
+            worker.sending = False
+            worker.sent += 1
+            worker.held -= 1
+            self._free_buffer(size)
+            if worker.sent == len(worker.part_sizes):
+                self.uploads_done_at = max(self.uploads_done_at, self.now)
+            self._try_send(worker)
+            self._try_read(worker)
+            if used_slot:
+                # any worker may have been waiting for the slot
+                self.free_read_ahead_slots += 1
+                for other in self.workers:
+                    self._try_read(other)
+
+        def transfer_done():
+            heapq.heappush(self.timers, (self.now + self.rtt, id(worker), response_received))
+
+        def hash_done():
+            self._start_flow("network", size, None, transfer_done)
+
+        self._start_flow("cpu", size * HASH_PASSES_PER_PART, self.hash_rate, hash_done)
+        self._try_read(worker)
+
+    def _allocate_buffer(self, size):
+        self.buffers_in_use += 1
+        self.buffer_bytes += size
+        self.peak_buffer_bytes = max(self.peak_buffer_bytes, self.buffer_bytes)
+
+    def _free_buffer(self, size):
+        self.buffers_in_use -= 1
+        self.buffer_bytes -= size